@@ -1,16 +1,46 @@
-import subprocess
 import os
 import json
 import sys
 import logging
+import logging.handlers
+import functools
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson # Optional, parses and serializes JSON faster than the standard library
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash # Optional, fingerprints the sources faster than hashlib
+except ImportError:
+    xxhash = None
 
 
 # Configuration
 LOGGER_NAME = "backuplog"
 LOGGER_FILE = "backup.log"
+LOGGER_FILE_BUFFER_CAPACITY = 1024
+LOGGER_FORMAT = "%(asctime)s [%(levelname)s] - %(message)s"
 CONFIGURATION_FILE = "backup.json"
+BACKUP_STATE_FILE = "backup.state.json"
 NOTIFICATION_ICON_FILE = "backup.ico"
 HOME_DIRECTORY_MARKER = "%HOME%"
+ROBOCOPY_OUTPUT_BUFFER_SIZE = 64 * 1024
+
+# robocopy options used by every backup
+ROBOCOPY_COMMON_OPTIONS = (
+    "/NP",      # Specifies that the progress of the copying operation (the number of files or directories copied so far) won't be displayed.
+    "/NC",      # Specifies that file classes are not to be logged.
+    "/NDL",     # Specifies that directory names are not to be logged.
+    "/NJH",     # Specifies that there's no job header.
+    "/XJ",      # Excludes junction points, which are normally included by default.
+)
+
+# Loaded by Backup._notify the first time a notification is shown
+WindowsBalloonTip = None
 
 
 class Utilities:
@@ -36,6 +66,200 @@ class Utilities:
         return var
         
 
+    @staticmethod
+    def parse_json(content:bytes):
+        """
+        Parse a JSON document, using orjson if it's installed.
+
+        Args:
+            content (bytes): The JSON document, encoded in UTF-8 (with or without BOM), UTF-16 or UTF-32.
+
+        Returns:
+            The parsed document.
+
+        Raises:
+            ValueError: If the document cannot be decoded or is not valid JSON.
+        """
+
+        # Decode once for both parsers: json.loads would detect UTF-8 (with or without BOM), UTF-16 and UTF-32 by itself, but orjson only accepts UTF-8
+        text = content.decode(json.detect_encoding(content))
+
+        return orjson.loads(text) if orjson else json.loads(text)
+
+
+    @staticmethod
+    def serialize_json(obj) -> bytes:
+        """
+        Serialize an object to an indented JSON document, using orjson if it's installed.
+
+        Args:
+            obj: The object to serialize.
+
+        Returns:
+            bytes: The JSON document, UTF-8 encoded.
+        """
+
+        if orjson:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+        return json.dumps(obj, indent=2).encode("utf-8") # Same indentation as orjson.OPT_INDENT_2
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def load_json(path:str, mtime_ns:int, size:int):
+        """
+        Load a JSON file. The result is cached, so the file is parsed again only when it changes.
+
+        Args:
+            path (str): The path of the JSON file.
+            mtime_ns (int): The modification time of the file, in nanoseconds. Part of the cache key.
+            size (int): The size of the file, in bytes. Part of the cache key.
+
+        Returns:
+            dict: The parsed content of the file. It must not be modified, since it's shared with later calls.
+        """
+
+        with open(path, 'rb') as json_file:
+            return Utilities.parse_json(json_file.read())
+
+
+    @staticmethod
+    def walk_tree(path:str):
+        """
+        Walk a directory tree, yielding every file and directory inside it with its stat.
+
+        Args:
+            path (str): The root directory.
+
+        Yields:
+            tuple: The path of the entry and its os.stat_result.
+
+        Notes:
+            - Uses the stat information returned by os.scandir, which on Windows doesn't require an extra system call per entry (unlike os.walk + os.stat).
+            - The entries of each directory are yielded in name order, so the walk is deterministic.
+            - Junction points and symbolic links are not followed, like robocopy does with /XJ.
+            - Directories that cannot be read are skipped.
+        """
+
+        directories = [path]
+        while directories:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    entries = sorted(entries, key=lambda entry: entry.name)
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                yield entry.path, entry_stat
+                if entry.is_dir(follow_symlinks=False) and not getattr(entry_stat, "st_file_attributes", 0) & stat.FILE_ATTRIBUTE_REPARSE_POINT:
+                    directories.append(entry.path)
+
+
+    @staticmethod
+    def get_source_fingerprint(source_dir:str, filenames:list = None):
+        """
+        Compute a fingerprint of the name, modification time and size of every entry of a source.
+
+        Args:
+            source_dir (str): The source directory path.
+            filenames (list, optional): The filenames in the source directory (if fingerprinting files). Defaults to None (fingerprinting the whole directory tree).
+
+        Returns:
+            str: The fingerprint, or None if the source directory cannot be read (when fingerprinting the whole directory tree).
+
+        Notes:
+            - Any file or directory added, removed, renamed or modified changes the fingerprint.
+        """
+
+        # Not used for security, so a fast non-cryptographic hash is preferred
+        if xxhash:
+            fingerprint = xxhash.xxh3_64()
+        else:
+            import hashlib # Only needed when skipping the unchanged sources
+            fingerprint = hashlib.sha1()
+
+        def add_entry(name, entry_stat):
+            fingerprint.update(f"{name}|{entry_stat.st_mtime_ns}|{entry_stat.st_size}\n".encode("utf-8", "surrogatepass"))
+
+        if filenames:
+            for filename in filenames:
+                try:
+                    add_entry(filename, os.stat(os.path.join(source_dir, filename)))
+                except OSError:
+                    fingerprint.update(f"{filename}|missing\n".encode("utf-8", "surrogatepass"))
+
+            return fingerprint.hexdigest()
+
+        try:
+            add_entry("", os.stat(source_dir))
+        except OSError:
+            return None
+
+        root_length = len(os.path.join(source_dir, ""))
+        for path, entry_stat in Utilities.walk_tree(source_dir):
+            add_entry(path[root_length:], entry_stat)
+
+        return fingerprint.hexdigest()
+
+
+    @staticmethod
+    def get_directory_size_estimate(path:str) -> int:
+        """
+        Estimate the size of a directory, summing the sizes of the files directly inside it.
+
+        Args:
+            path (str): The directory path.
+
+        Returns:
+            int: The estimated size in bytes, or 0 if the directory cannot be read.
+
+        Notes:
+            - Subdirectories are not walked: the estimate is only used to start the biggest backups first.
+        """
+
+        size = 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+
+        return size
+
+
+    @staticmethod
+    def get_parent_source(path:str, directories:list):
+        """
+        Find the directory that contains a given path.
+
+        Args:
+            path (str): The path to look for.
+            directories (list): The candidate directories.
+
+        Returns:
+            str: The first directory that is the path itself or one of its parents, or None if there is none.
+
+        Notes:
+            - The comparison is case insensitive, like Windows paths.
+        """
+
+        normalized_path = os.path.normcase(path)
+        for directory in directories:
+            normalized_directory = os.path.normcase(directory)
+            if normalized_path == normalized_directory or normalized_path.startswith(os.path.join(normalized_directory, "")):
+                return directory
+
+        return None
+
+
     @staticmethod
     def convert_to_directory_path(path):
         """
@@ -48,11 +272,11 @@ class Utilities:
             str: The directory path.
 
         Notes:
-            - If the input path is not absolute, it logs an error and returns None.
+            - If the input path does not start with a drive letter (e.g., C:\\), it returns None.
         """
 
-        if os.path.isabs(path):
-            return path.replace(":", "")
+        if len(path) > 2 and path[1] == ":" and path[2] in "\\/":
+            return path[0] + path[2:]
         else:
             return None
 
@@ -74,18 +298,17 @@ class Backup:
         self.log = self._configure_logging(console_log=True, file_log=True)
 
         self.username = Utilities.get_env("USERNAME")       
-        self.log.info(f"Username: {self.username}")
+        self.log.info("Username: %s", self.username)
 
         self.computername = Utilities.get_env("COMPUTERNAME")
-        self.log.info(f"Computer name: {self.computername}")
+        self.log.info("Computer name: %s", self.computername)
 
         self._configure_backup_script_from_file()
         self.log.setLevel(logging.DEBUG if self.debug else logging.INFO)
-        self.log.info(f"Script configuration: debug={self.debug}, dryrun={self.dryrun}")
+        self.log.info("Script configuration: debug=%s, dryrun=%s", self.debug, self.dryrun)
 
-        self.backup_directory_full = os.path.join(self.backup_directory, self.username, self.computername)
-        self.log.info(f"Backup root: {self.backup_directory}")
-        self.log.info(f"Backup directory: {self.backup_directory_full}")
+        self.log.info("Backup root: %s", self.backup_directory)
+        self.log.info("Backup directory: %s", self.backup_directory_full)
 
 
     def _configure_backup_script_from_file(self) -> None:
@@ -94,48 +317,154 @@ class Backup:
         """
 
         config_file_path = os.path.join(self.configuration_path, CONFIGURATION_FILE)
-        self.log.info(f"Reading configuration file {config_file_path}...")
-        with open(config_file_path, 'r') as config_file:
-            config = json.load(config_file)
-
-        home_directory = config.get("home_directory", None)
-        if home_directory:
-            home_directory = os.path.normpath(home_directory)
-            
-        self.source_directories = config.get("source_directories", [])
-        self.source_directories = [os.path.normpath(path.replace(HOME_DIRECTORY_MARKER, os.path.join(home_directory, self.username))) for path in self.source_directories]
-        self.log.info(f"Found {len(self.source_directories)} directories to backup")
-
-        self.source_files = config.get("source_files", [])
-        self.source_files = [os.path.normpath(path.replace(HOME_DIRECTORY_MARKER, os.path.join(home_directory, self.username))) for path in self.source_files]
-        self.log.info(f"Found {len(self.source_files)} files to backup")
+        self.log.info("Reading configuration file %s...", config_file_path)
+        config_file_stat = os.stat(config_file_path)
+        config = Utilities.load_json(config_file_path, config_file_stat.st_mtime_ns, config_file_stat.st_size)
 
         self.backup_directory = config.get("backup_directory", None)
         if self.backup_directory is None:
             raise ValueError("Backup directory not found in the configuration file")
 
         self.backup_directory = os.path.normpath(self.backup_directory)
+        self.backup_directory_full = os.path.join(self.backup_directory, self.username, self.computername)
+
+        home_directory = config.get("home_directory", None)
+        user_home_directory = os.path.join(os.path.normpath(home_directory), self.username) if home_directory else ""
+
+        self.source_directories = config.get("source_directories", [])
+        self.source_files = config.get("source_files", [])
+        if not user_home_directory and any(HOME_DIRECTORY_MARKER in path for path in self.source_directories + self.source_files):
+            raise ValueError(f"Home directory not found in the configuration file but {HOME_DIRECTORY_MARKER} is used")
+
+        def expand_paths(paths):
+            normpath = os.path.normpath
+            return [normpath(path.replace(HOME_DIRECTORY_MARKER, user_home_directory)) for path in paths]
+
+        self.source_directories = expand_paths(self.source_directories)
+        self.log.info("Found %s directories to backup", len(self.source_directories))
+
+        self.source_files = expand_paths(self.source_files)
+        self.log.info("Found %s files to backup", len(self.source_files))
+
+        # Resolve the destination of every source once, backup() just runs the jobs.
+        self.directory_jobs = []
+        for source_dir in self.source_directories:
+            source_path = Utilities.convert_to_directory_path(source_dir)
+            if not source_path:
+                self.log.error("Input path %s is not an absolute path", source_dir)
+                continue
+
+            self.directory_jobs.append((source_dir, os.path.join(self.backup_directory_full, source_path)))
+
+        # A source inside another source directory is already copied by the /MIR of its parent. Running both jobs at the same time would make two
+        # robocopy write the same destination files, so the nested sources are dropped (and counted as successfull).
+        directory_sources = [source_dir for source_dir, _ in self.directory_jobs]
+        self.covered_directories = 0
+        directory_jobs = []
+        for index, (source_dir, destination_dir) in enumerate(self.directory_jobs):
+            # Compared with the entries before it (including duplicates of itself) and with the other directories after it
+            other_sources = directory_sources[:index] + [other for other in directory_sources[index + 1:] if os.path.normcase(other) != os.path.normcase(source_dir)]
+            parent_directory = Utilities.get_parent_source(source_dir, other_sources)
+            if parent_directory:
+                if os.path.normcase(parent_directory) == os.path.normcase(source_dir):
+                    self.log.info("Source directory %s is listed more than once, skipping the duplicate", source_dir)
+                else:
+                    self.log.info("Source directory %s is already backed up with %s, skipping it", source_dir, parent_directory)
+
+                self.covered_directories += 1
+                continue
+
+            directory_jobs.append((source_dir, destination_dir))
+
+        self.directory_jobs = directory_jobs
+        parent_directories = [source_dir for source_dir, _ in self.directory_jobs]
+
+        file_groups = {}
+        for source_file in self.source_files:
+            source_dir, filename = os.path.split(source_file)
+            file_groups.setdefault(source_dir, []).append(filename)
+
+        self.covered_files = 0
+        self.file_jobs = []
+        for source_dir, filenames in file_groups.items():
+            parent_directory = Utilities.get_parent_source(source_dir, parent_directories)
+            if parent_directory:
+                self.log.info("Source files %s are already backed up with %s, skipping them", ", ".join(os.path.join(source_dir, filename) for filename in filenames), parent_directory)
+                self.covered_files += len(filenames)
+                continue
+
+            source_path = Utilities.convert_to_directory_path(source_dir)
+            if not source_path:
+                self.log.error("Input path %s is not an absolute path", source_dir)
+                continue
+
+            self.file_jobs.append((source_dir, os.path.join(self.backup_directory_full, source_path), filenames))
+
         self.debug = config.get("debug", False)
         self.dryrun = config.get("dryrun", True)
         self.notification = config.get("notification", False)
+        self.unbuffered_io = config.get("unbuffered_io", True)
+        self.restartable = config.get("restartable", False)
+        self.wait_seconds = config.get("wait_seconds", 1)
+        self.retries = config.get("retries", 1)
+        self.skip_unchanged = config.get("skip_unchanged", False)
+
+        self.mt_threads = config.get("mt_threads", 16)
+        if not isinstance(self.mt_threads, int) or not 1 <= self.mt_threads <= 128:
+            raise ValueError(f"Invalid mt_threads value {self.mt_threads}: it must be an integer between 1 and 128")
+
+        self.max_jobs = config.get("max_jobs", 8)
+        if not isinstance(self.max_jobs, int) or not 1 <= self.max_jobs <= 8:
+            raise ValueError(f"Invalid max_jobs value {self.max_jobs}: it must be an integer between 1 and 8")
          
 
-    def _backup_object(self, source_dir:str, destination_dir:str, filename = None) -> bool:
+    def _backup_object(self, source_dir:str, destination_dir:str, filenames:list = None) -> bool:
         """
-        Perform a backup of a source directory (or file) to a destination directory (or file).
+        Perform a backup of a source directory (or files) to a destination directory.
 
         Args:
             source_dir (str): The source directory path.
             destination_dir (str): The destination directory path.
-            filename (str, optional): The filename to copy (if copying a file). Defaults to None (copying a directory).
+            filenames (list, optional): The filenames to copy from the source directory (if copying files). Defaults to None (copying a directory).
 
         Notes:
             - Uses robocopy to perform the incremental backup.
             - MS documentation on robocopy: https://learn.microsoft.com/en-us/windows-server/administration/windows-commands/robocopy
         """
 
-        source_object = os.path.join(source_dir, filename) if filename else source_dir
-        self.log.info(f"Starting backup of {source_object} in {destination_dir}...")
+        # Skip the missing sources (e.g., optional directories) without starting robocopy
+        if filenames:
+            existing_filenames = []
+            for filename in filenames:
+                if os.path.isfile(os.path.join(source_dir, filename)):
+                    existing_filenames.append(filename)
+                else:
+                    self.log.warning("Source file %s does not exist, skipping it", os.path.join(source_dir, filename))
+
+            if not existing_filenames:
+                return True
+
+            filenames = existing_filenames
+        elif not os.path.isdir(source_dir):
+            self.log.warning("Source directory %s does not exist, skipping it", source_dir)
+            return True
+
+        source_object = ", ".join(os.path.join(source_dir, filename) for filename in filenames) if filenames else source_dir
+
+        if self.skip_unchanged:
+            source_fingerprint = Utilities.get_source_fingerprint(source_dir, filenames)
+            # The destination is checked too, so that at least a deleted backup is copied again even if the source didn't change
+            if filenames:
+                destination_exists = all(os.path.isfile(os.path.join(destination_dir, filename)) for filename in filenames)
+            else:
+                destination_exists = os.path.isdir(destination_dir)
+
+            if source_fingerprint and destination_exists and self.backup_state.get(source_object) == source_fingerprint:
+                self.log.info("Skipping backup of %s: unchanged since the last backup", source_object)
+                self.updated_backup_state[source_object] = source_fingerprint
+                return True
+
+        self.log.info("Starting backup of %s in %s...", source_object, destination_dir)
 
         robocopy_command = [
             "robocopy",
@@ -143,38 +472,71 @@ class Backup:
             destination_dir,
         ]
 
-        if filename:
-            robocopy_command.append(filename)
+        if filenames:
+            robocopy_command.extend(filenames) # A single robocopy scans the source directory once for all the files
         else:
             robocopy_command.append("/MIR") # Mirror the source directory to the destination
 
-        robocopy_command.append("/Z")       # Copies files in restartable mode. In restartable mode, should a file copy be interrupted, robocopy can pick up where it left off rather than recopying the entire file.
-        robocopy_command.append("/NP")      # Specifies that the progress of the copying operation (the number of files or directories copied so far) won't be displayed.
-        robocopy_command.append("/NC")      # Specifies that file classes are not to be logged.
-        robocopy_command.append("/NDL")     # Specifies that directory names are not to be logged.
-        robocopy_command.append("/NJH")     # Specifies that there's no job header.
-        robocopy_command.append("/W:10")    # Specifies the wait time between retries, in seconds. Reduced from the default 30 to 10.
-        robocopy_command.append("/R:2")     # Specifies the number of retries on failed copies. By default it would retry 1mil times, which makes sense if the backup is on the network but doesn't for local drives.
-        robocopy_command.append("/XJ")      # Excludes junction points, which are normally included by default.
+        if self.restartable:
+            robocopy_command.append("/Z")   # Copies files in restartable mode. In restartable mode, should a file copy be interrupted, robocopy can pick up where it left off rather than recopying the entire file. Much slower, only worth it for unreliable network drives.
+
+        robocopy_command.extend(ROBOCOPY_COMMON_OPTIONS)
+
+        log_output = self.log.isEnabledFor(logging.DEBUG)
+        if not log_output:
+            robocopy_command.append("/NFL") # Specifies that file names are not to be logged. The list of files is only useful in debug mode.
+
+        robocopy_command.append(f"/W:{self.wait_seconds}") # Specifies the wait time between retries, in seconds. Reduced from the default 30, a lock on a local drive is released quickly.
+        robocopy_command.append(f"/R:{self.retries}")      # Specifies the number of retries on failed copies. By default it would retry 1mil times, which makes sense if the backup is on the network but doesn't for local drives.
+
+        if self.unbuffered_io:
+            robocopy_command.append("/J")   # Copies using unbuffered I/O, bypassing the cache manager. Recommended for large files. Not compatible with /EFSRAW.
+
+        robocopy_command.append(f"/MT:{self.mt_threads}") # Creates multi-threaded copies with n threads (1-128). Without it robocopy copies one file at a time.
 
         if self.dryrun:
             robocopy_command.append("/L")   # Specifies that files are to be listed only (and not copied, deleted, or time stamped).
 
+        import subprocess # Not needed when every source is skipped
+
         CREATE_NO_WINDOW = 0x08000000
-        process = subprocess.Popen(robocopy_command, stdout=subprocess.PIPE, universal_newlines=True, creationflags=CREATE_NO_WINDOW)
-        for line in iter(process.stdout.readline, ""):
-            self.log.debug(line.strip())
-        process.stdout.close()
-
-        process.wait()
-        if process.returncode >= 8:
-            self.log.error(f"Backup of {source_object} failed")
+        if log_output:
+            process = subprocess.Popen(robocopy_command, stdout=subprocess.PIPE, bufsize=ROBOCOPY_OUTPUT_BUFFER_SIZE, universal_newlines=True, creationflags=CREATE_NO_WINDOW)
+            # Drain the output in its own thread so that robocopy never waits on a full pipe while lines are being logged
+            output_thread = threading.Thread(target=self._log_output, args=(source_object, process.stdout), daemon=True)
+            output_thread.start()
+            returncode = process.wait()
+            output_thread.join()
+            process.stdout.close()
+        else:
+            # The robocopy output is only logged in debug mode, let robocopy write it straight to the null device.
+            returncode = subprocess.run(robocopy_command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=CREATE_NO_WINDOW).returncode
+
+        if returncode >= 8:
+            self.log.error("Backup of %s failed", source_object)
             return False
         
-        self.log.info(f"Backup of {source_object} completed successfully")
+        if self.skip_unchanged and source_fingerprint:
+            self.updated_backup_state[source_object] = source_fingerprint
+
+        self.log.info("Backup of %s completed successfully", source_object)
         return True
 
 
+    def _log_output(self, source_object:str, stream) -> None:
+        """
+        Log every line of a process output at debug level.
+
+        Args:
+            source_object (str): The source being backed up, prepended to every line since several jobs log at the same time.
+            stream: The text stream connected to the process output.
+        """
+
+        log_debug = self.log.debug
+        for line in stream:
+            log_debug("%s: %s", source_object, line.rstrip())
+
+
     def backup(self) -> bool:
         """
         Perform the backup of source directories and files to the destination directory.
@@ -183,32 +545,41 @@ class Backup:
             bool: True if the backup completed successfully, False otherwise.
         """
 
-        total_directories = len(self.source_directories)
-        successfull_directories = 0 
-        for source_dir in self.source_directories:
-            source_path = Utilities.convert_to_directory_path(source_dir)
-            if not source_path:
-                self.log.error(f"Input path {source_path} is not an absolute path")
-                continue
+        state_file_path = os.path.join(self.backup_directory_full, BACKUP_STATE_FILE)
+        self.backup_state = self._load_backup_state(state_file_path) if self.skip_unchanged else {}
+        self.updated_backup_state = {}
+
+        # Estimate the size of the sources
+        jobs = []
+        for source_dir, destination_dir in self.directory_jobs:
+            jobs.append((Utilities.get_directory_size_estimate(source_dir), source_dir, destination_dir, None))
+
+        for source_dir, destination_dir, filenames in self.file_jobs:
+            size = 0
+            for filename in filenames:
+                try:
+                    size += os.stat(os.path.join(source_dir, filename)).st_size
+                except OSError:
+                    pass
+
+            jobs.append((size, source_dir, destination_dir, filenames))
+
+        # Start the biggest jobs first, so that they don't end up running alone at the end of the backup
+        jobs.sort(key=lambda job: job[0], reverse=True)
 
-            destination_dir = os.path.join(self.backup_directory_full, source_path)
-            if self._backup_object(source_dir, destination_dir):
-                successfull_directories += 1
-            
+        # Each job only waits on its own robocopy process, so threads are enough to run them in parallel.
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as executor:
+            futures = [(executor.submit(self._backup_object, source_dir, destination_dir, filenames), filenames) for _, source_dir, destination_dir, filenames in jobs]
+
+        total_directories = len(self.source_directories)
+        successfull_directories = self.covered_directories + sum(1 for future, filenames in futures if not filenames and future.result())
         total_files = len(self.source_files)
-        successfull_files = 0
-        for source_file in self.source_files:
-            source_dir, filename = os.path.split(source_file)
-            source_path = Utilities.convert_to_directory_path(source_dir)
-            if not source_path:
-                self.log.error(f"Input path {source_path} is not an absolute path")
-                continue
+        successfull_files = self.covered_files + sum(len(filenames) for future, filenames in futures if filenames and future.result())
 
-            destination_dir = os.path.join(self.backup_directory_full, source_path)
-            if self._backup_object(source_dir, destination_dir, filename):
-                successfull_files += 1
-        
-        if successfull_directories != len(self.source_directories) or successfull_files != len(self.source_files):
+        if self.skip_unchanged and not self.dryrun:
+            self._save_backup_state(state_file_path, self.updated_backup_state)
+
+        if successfull_directories != total_directories or successfull_files != total_files:
             message = f"Errors during the backup procedure. {successfull_directories}/{total_directories} successfull directories. {successfull_files}/{total_files} successfull files"
             self.log.error(message)
             self._notify(message)
@@ -220,9 +591,50 @@ class Backup:
         return True
     
 
+    def _load_backup_state(self, state_file_path:str) -> dict:
+        """
+        Load the fingerprints of the sources saved by the last backup.
+
+        Args:
+            state_file_path (str): The path of the state file.
+
+        Returns:
+            dict: The fingerprint of each source, or an empty dictionary if the state file does not exist or is not valid.
+        """
+
+        try:
+            with open(state_file_path, 'rb') as state_file:
+                return Utilities.parse_json(state_file.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log.warning("Cannot read the backup state file %s, all the sources will be backed up: %s", state_file_path, e)
+            return {}
+
+
+    def _save_backup_state(self, state_file_path:str, backup_state:dict) -> None:
+        """
+        Save the fingerprints of the sources backed up successfully.
+
+        Args:
+            state_file_path (str): The path of the state file.
+            backup_state (dict): The fingerprint of each source.
+        """
+
+        try:
+            os.makedirs(os.path.dirname(state_file_path), exist_ok=True)
+            with open(state_file_path, 'wb') as state_file:
+                state_file.write(Utilities.serialize_json(backup_state))
+        except OSError as e:
+            self.log.warning("Cannot write the backup state file %s: %s", state_file_path, e)
+
+
     def _notify(self, message):
+        global WindowsBalloonTip
         if self.notification:
-            from notification import WindowsBalloonTip
+            if WindowsBalloonTip is None:
+                from notification import WindowsBalloonTip # Imported on first use, pywin32 is only required for notifications
+
             w=WindowsBalloonTip(message, "Backup", os.path.join(self.resources_path, NOTIFICATION_ICON_FILE), duration=5)
 
 
@@ -233,11 +645,17 @@ class Backup:
         Args:
             console_log (bool): Enable console logging.
             file_log (bool): Enable file logging.
+
+        Notes:
+            - The handlers are installed only once per process, later Backup objects reuse them instead of logging every line multiple times.
         """
 
         log = logging.getLogger(LOGGER_NAME)
         log.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s [%(levelname)s] - %(message)s')
+        if log.handlers:
+            return log
+
+        formatter = logging.Formatter(LOGGER_FORMAT)
 
         if console_log:
             console_handler = logging.StreamHandler()
@@ -245,9 +663,13 @@ class Backup:
             log.addHandler(console_handler)
 
         if file_log:
-            file_handler = logging.FileHandler(os.path.join(self.log_path, LOGGER_FILE), mode='w')
+            file_handler = logging.FileHandler(os.path.join(self.log_path, LOGGER_FILE), mode='w', encoding='utf-8', delay=True)
             file_handler.setFormatter(formatter)
-            log.addHandler(file_handler)
+
+            # Write the debug records (the robocopy output) in batches. Any info record or above flushes the batch immediately,
+            # so the log is up to date even if the scheduled task kills the process and the exit handlers never run.
+            buffered_file_handler = logging.handlers.MemoryHandler(LOGGER_FILE_BUFFER_CAPACITY, flushLevel=logging.INFO, target=file_handler)
+            log.addHandler(buffered_file_handler)
 
         return log
 
@@ -39,7 +39,12 @@ class WindowsBalloonTip:
         Shell_NotifyIcon(NIM_ADD, (self.hwnd, 0, NIF_ICON | NIF_MESSAGE | NIF_TIP, win32con.WM_USER+20, hicon, "tooltip"))
         Shell_NotifyIcon(NIM_MODIFY, (self.hwnd, 0, NIF_INFO, win32con.WM_USER+20, hicon, "Balloon  tooltip", title, 200, msg))
 
-        time.sleep(duration)
+        # Keep processing the window messages, otherwise the balloon may never be displayed
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            PumpWaitingMessages()
+            time.sleep(0.05)
+
         DestroyWindow(self.hwnd)
 
 
@@ -1,4 +1,5 @@
 import os
+import re
 import subprocess
 import venv
 
@@ -10,6 +11,7 @@ REQUIREMENTS_FILE = "requirements.txt"
 BACKUP_FILE = "backup.py"
 SCHEDULED_TASK_CONFIG = "scheduled_task_config.xml"
 SCHEDULED_TASK_CONFIG_OUT = "scheduled_task_config_generated.xml"
+SCHEDULED_TASK_CONFIG_MARKERS = re.compile(r"%PYTHON%|%SCRIPT%")
 
 
 def register_scheduled_task(script_path:str) -> None:
@@ -30,8 +32,11 @@ def register_scheduled_task(script_path:str) -> None:
     with open(input_xml_file, "r", encoding="utf-16-le") as f_in:
         xml_content = f_in.read()
 
-        xml_content = xml_content.replace("%PYTHON%", os.path.join(venv_path, "Scripts", "pythonw.exe"))
-        xml_content = xml_content.replace("%SCRIPT%", os.path.join(script_path, BACKUP_FILE))
+        markers = {
+            "%PYTHON%": os.path.join(venv_path, "Scripts", "pythonw.exe"),
+            "%SCRIPT%": os.path.join(script_path, BACKUP_FILE),
+        }
+        xml_content = SCHEDULED_TASK_CONFIG_MARKERS.sub(lambda match: markers[match.group(0)], xml_content)
 
         with open(output_xml_file, "w", encoding="utf-16-le") as f_out:
             f_out.write(xml_content)